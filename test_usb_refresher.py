@@ -0,0 +1,157 @@
+import argparse
+import socket
+import threading
+
+import pytest
+
+import usb_refresher
+
+
+DEVCON_HWIDS_OUTPUT = """\
+USB\\ROOT_HUB30\\4&2A1B3C4D&0&0
+    Name: USB Root Hub (USB 3.0)
+    Hardware IDs:
+        USB\\ROOT_HUB30&VID8086&PID A36D&REV0010
+        USB\\ROOT_HUB30
+USB\\VID_18D1&PID_4EE7\\0A1B2C3D
+    Name: Android Composite ADB Interface
+    Hardware IDs:
+        USB\\VID_18D1&PID_4EE7&REV_0310
+        USB\\VID_18D1&PID_4EE7
+    Compatible IDs:
+        USB\\Class_ff&SubClass_42&Prot_01
+2 matching device(s) found.
+"""
+
+
+def test_parse_devcon_hwids_reads_indented_name_and_hwids():
+    devices = usb_refresher.parse_devcon_hwids(DEVCON_HWIDS_OUTPUT)
+
+    assert [device["id"] for device in devices] == [
+        "USB\\ROOT_HUB30\\4&2A1B3C4D&0&0",
+        "USB\\VID_18D1&PID_4EE7\\0A1B2C3D",
+    ]
+    hub, android = devices
+    assert hub["name"] == "USB Root Hub (USB 3.0)"
+    assert hub["hwids"] == []
+    assert not hub["matched_by_name"]
+    assert android["name"] == "Android Composite ADB Interface"
+    assert android["hwids"] == ["USB\\VID_18D1&PID_4EE7", "USB\\VID_18D1&PID_4EE7"]
+    assert android["matched_by_name"]
+
+
+def test_parse_devcon_hwids_ignores_summary_line():
+    assert usb_refresher.parse_devcon_hwids("No matching devices found.\n") == []
+
+
+def _frame(payload):
+    data = payload.encode()
+    return b"%04x%s" % (len(data), data)
+
+
+def test_adb_pop_message_waits_for_complete_frame():
+    buffer = bytearray(_frame("A\tdevice\n")[:6])
+    assert usb_refresher._adb_pop_message(buffer) is None
+
+    buffer += _frame("A\tdevice\n")[6:] + _frame("")
+    assert usb_refresher._adb_pop_message(buffer) == "A\tdevice\n"
+    assert usb_refresher._adb_pop_message(buffer) == ""
+    assert usb_refresher._adb_pop_message(buffer) is None
+    assert buffer == bytearray()
+
+
+def _serve_once(reply):
+    server = socket.create_server(("127.0.0.1", 0))
+    received = []
+
+    def handle():
+        conn, _ = server.accept()
+        with conn:
+            received.append(conn.recv(64))
+            conn.sendall(reply)
+        server.close()
+
+    threading.Thread(target=handle, daemon=True).start()
+    return server.getsockname(), received
+
+
+def test_connect_track_devices_sends_framed_request():
+    address, received = _serve_once(b"OKAY" + _frame("A\tdevice\n"))
+    sock = usb_refresher.connect_track_devices(address)
+    with sock:
+        assert usb_refresher._adb_recv_message(sock) == "A\tdevice\n"
+    assert received == [b"0012host:track-devices"]
+
+
+def test_connect_track_devices_raises_on_fail():
+    address, _ = _serve_once(b"FAIL" + _frame("unknown host service"))
+    with pytest.raises(usb_refresher.CommandError, match="unknown host service"):
+        usb_refresher.connect_track_devices(address)
+
+
+def _run_daemon(monkeypatch, streams, recover_results=(), timeout=5, grace=0.05, close_after=0.3):
+    """Feed each snapshot list to the daemon on its own connection.
+
+    Writers are closed after ``close_after`` seconds unless the daemon has
+    already dropped the connection to run a recovery.
+    """
+    monkeypatch.setattr(usb_refresher, "DAEMON_GRACE_PERIOD", grace)
+    monkeypatch.setattr(usb_refresher, "DAEMON_READ_INTERVAL", 0.02)
+    daemon_ends = []
+    writers = []
+    for snapshots in streams:
+        daemon_end, writer = socket.socketpair()
+        writer.sendall(b"".join(_frame(snapshot) for snapshot in snapshots))
+        daemon_ends.append(daemon_end)
+        writers.append(writer)
+        threading.Timer(close_after, writer.close).start()
+
+    monkeypatch.setattr(
+        usb_refresher, "_connect_adb_server", lambda adb_path: daemon_ends.pop(0) if daemon_ends else None
+    )
+    calls = []
+    results = list(recover_results)
+
+    def fake_recover(adb_path, devcon_path, args, state):
+        calls.append(state)
+        return results.pop(0) if results else 1
+
+    monkeypatch.setattr(usb_refresher, "recover", fake_recover)
+    args = argparse.Namespace(serial=None, timeout=timeout)
+    result = usb_refresher.run_daemon("adb", "devcon", args)
+    for writer in writers:
+        writer.close()
+    return result, calls
+
+
+def test_daemon_ignores_unplug_and_replug_handshake(monkeypatch):
+    result, calls = _run_daemon(monkeypatch, [["A\tdevice\n", "", "A\toffline\n", "A\tdevice\n"]])
+    assert result == 1  # the stream ended and the server could not be reached again
+    assert calls == []
+
+
+def test_daemon_ignores_non_offline_modes(monkeypatch):
+    _, calls = _run_daemon(monkeypatch, [["A\tdevice\n", "A\tsideload\n"], ["A\tbootloader\n"]])
+    assert calls == []
+
+
+def test_daemon_recovers_device_that_stays_offline(monkeypatch):
+    _, calls = _run_daemon(monkeypatch, [["A\tdevice\n", "A\toffline\n"]], recover_results=[0])
+    assert calls == ["offline"]
+
+
+def test_daemon_recovers_offline_device_that_vanishes(monkeypatch):
+    _, calls = _run_daemon(monkeypatch, [["A\tdevice\n", "A\toffline\n", ""]], recover_results=[0])
+    assert calls == [None]
+
+
+def test_daemon_handles_already_expired_grace(monkeypatch):
+    # A zero grace period leaves the deadline expired before the next read.
+    _, calls = _run_daemon(monkeypatch, [["A\tdevice\n", "A\toffline\n"]], recover_results=[0], grace=0.0)
+    assert calls == ["offline"]
+
+
+def test_daemon_caps_failed_recoveries(monkeypatch):
+    streams = [["A\tdevice\n", "A\toffline\n"]] + [["A\toffline\n"]] * usb_refresher.DAEMON_MAX_RECOVERIES
+    _, calls = _run_daemon(monkeypatch, streams, timeout=0)
+    assert calls == ["offline"] * usb_refresher.DAEMON_MAX_RECOVERIES
@@ -6,36 +6,75 @@ How it works:
 - Verifies Administrator privileges on Windows.
 - Locates adb.exe and devcon.exe (using provided paths or PATH).
 - Runs `adb devices` to determine whether the target device is healthy.
-- If unhealthy, performs a soft reset (restart ADB server + reconnect) and rechecks.
+- If unhealthy, performs a soft reset (kill ADB server + reconnect, which
+  restarts it) and waits for the device with `adb wait-for-device`.
 - If still unhealthy, locates the USB device via devcon by name or VID/PID,
-  performs a disable/enable cycle, then restarts ADB and polls until healthy.
+  restarts it (`devcon restart`, or a disable/enable cycle), then restarts ADB and polls until healthy.
+- A devcon instance ID matched by name is cached in
+  %LOCALAPPDATA%\\usb_refresher\\devcon.json and reused on later runs when
+  `devcon status` confirms the device is still present.
+- If `adb wait-for-device` exits with an error, or returns before the device is
+  usable, the rest of the phase's timeout is spent health polling with
+  exponential backoff (see --poll-initial / --poll-max). A wait-for-device
+  timeout ends the phase directly.
 
 How to run:
     python usb_refresher.py --adb-path C:\\Android\\platform-tools\\adb.exe --devcon-path C:\\devcon.exe
 
+With --daemon, the script stays running and subscribes to the adb server's
+`host:track-devices` stream on 127.0.0.1:5037. A device that stays `offline`
+(or vanishes while offline) past a short grace period is recovered, with a
+bounded number of retries; a freshly plugged device gets the full --timeout to
+leave `offline`. Other states (connecting, sideload, bootloader, ...) and a
+plain unplug are never acted on. If the server cannot be reached
+it falls back to a single recovery pass.
+
 Required privileges:
 - Windows Administrator privileges are required to use devcon to disable/enable devices.
   The script exits with code 3 if it is not running as Administrator.
+
+Exit codes:
+- 0 healthy, 1 recovery failed, 2 executable not found, 3 not Administrator,
+  4 device unauthorized / no permissions (with --fast-fail).
 """
 
 import argparse
 import ctypes
+import functools
+import json
 import logging
 import os
 import re
 import shutil
+import socket
 import subprocess
 import sys
 import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 
 ADB_HEALTHY_STATE = "device"
+# States that need user action on the device/host; no reset can fix them.
+ADB_UNRECOVERABLE_STATES = {"unauthorized", "no permissions"}
+# The only state the daemon treats as wedged and recovers from.
+ADB_OFFLINE_STATE = "offline"
+# adb has no multi-command mode, so batching happens by dropping redundant
+# spawns: any adb client command starts the server on demand, so `reconnect`
+# brings the server back up without a separate `start-server` process.
 ADB_SOFT_RESET_COMMANDS = [
     ["kill-server"],
-    ["start-server"],
     ["reconnect"],
 ]
+# Used while devcon cycles the device: there is nothing to reconnect yet, so
+# only bring the server back up and let it pick the device up on arrival.
+ADB_SERVER_RESTART_COMMANDS = [
+    ["kill-server"],
+    ["start-server"],
+]
 ANDROID_DEVICE_NAME = "Android Composite ADB Interface"
+_ANDROID_NAME_CF = ANDROID_DEVICE_NAME.casefold()
 COMMON_ANDROID_VIDS = {
     "18D1",  # Google
     "0BB4",  # HTC
@@ -47,6 +86,39 @@ COMMON_ANDROID_VIDS = {
     "0502",  # Acer
     "05C6",  # Qualcomm
 }
+# Keep console children from flashing a window for every adb/devcon spawn.
+_CREATION_FLAGS = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+# First two whitespace-separated fields of a line; [ \t] keeps a match on one line.
+_DEV_LINE = re.compile(r"^[ \t]*(\S+)[ \t]+(no permissions|\S+)", re.MULTILINE)
+_HWID_RE = re.compile(r"USB\\VID_[0-9A-F]{4}&PID_[0-9A-F]{4}", re.IGNORECASE)
+_ANDROID_VID_RE = re.compile(r"VID_(" + "|".join(sorted(COMMON_ANDROID_VIDS)) + r")", re.IGNORECASE)
+DEVCON_CACHE_DIR = "usb_refresher"
+DEVCON_CACHE_FILE = "devcon.json"
+HEALTH_CACHE_TTL = 0.25
+# devcon exit code when the operation succeeded but needs a reboot to take effect.
+DEVCON_REBOOT_REQUIRED = 1
+DEVCON_DISABLE_WAIT = 2.0
+DEVCON_STATUS_INTERVAL = 0.1
+ADB_SERVER_ADDRESS = ("127.0.0.1", 5037)
+ADB_SERVER_CONNECT_TIMEOUT = 2.0
+DAEMON_GRACE_PERIOD = 5.0
+DAEMON_MAX_RECOVERIES = 3
+DAEMON_READ_INTERVAL = 1.0
+POLL_INITIAL_DELAY = 0.1
+POLL_MAX_DELAY = 2.0
+POLL_BACKOFF_FACTOR = 1.7
+
+_IsUserAnAdmin = None
+if sys.platform == "win32":
+    try:
+        _IsUserAnAdmin = ctypes.windll.shell32.IsUserAnAdmin
+        _IsUserAnAdmin.restype = ctypes.c_int
+        _IsUserAnAdmin.argtypes = []
+    except (OSError, AttributeError):
+        _IsUserAnAdmin = None
+
+# Recent get_adb_state results keyed by (adb_path, serial); cleared on resets.
+_HEALTH_CACHE: dict[tuple[str, str | None], tuple[float, str | None]] = {}
 
 
 class CommandError(Exception):
@@ -58,10 +130,37 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--adb-path", default="adb", help="Path to adb.exe (or adb on PATH).")
     parser.add_argument("--devcon-path", default="devcon", help="Path to devcon.exe (or devcon on PATH).")
     parser.add_argument("--timeout", type=int, default=30, help="Seconds to wait for recovery per phase.")
+    parser.add_argument(
+        "--poll-initial",
+        type=float,
+        default=POLL_INITIAL_DELAY,
+        help="Initial seconds between health checks when adb wait-for-device cannot be used.",
+    )
+    parser.add_argument(
+        "--poll-max",
+        type=float,
+        default=POLL_MAX_DELAY,
+        help="Maximum seconds between health checks (backoff cap).",
+    )
     parser.add_argument("--serial", help="ADB device serial to target.")
+    parser.add_argument(
+        "--fast-fail",
+        action="store_true",
+        help="Exit with code 4 without resetting when the device is unauthorized or lacks permissions.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and recover the device when adb track-devices shows it stuck unhealthy.",
+    )
     parser.add_argument("--dry-run", action="store_true", help="Log actions without executing devcon changes.")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging.")
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.poll_initial <= 0:
+        parser.error("--poll-initial must be greater than 0")
+    if args.poll_max < args.poll_initial:
+        parser.error("--poll-max must be greater than or equal to --poll-initial")
+    return args
 
 
 def configure_logging(verbose: bool) -> None:
@@ -69,15 +168,16 @@ def configure_logging(verbose: bool) -> None:
     logging.basicConfig(level=level, format="%(levelname)s: %(message)s")
 
 
+@functools.cache
 def is_windows_admin() -> bool:
     if sys.platform != "win32":
         return True
-    try:
-        return ctypes.windll.shell32.IsUserAnAdmin() != 0
-    except OSError:
+    if _IsUserAnAdmin is None:
         return False
+    return bool(_IsUserAnAdmin())
 
 
+@functools.lru_cache(maxsize=16)
 def resolve_executable(path: str) -> str | None:
     if os.path.sep in path or (os.path.altsep and os.path.altsep in path):
         if os.path.isfile(path):
@@ -89,185 +189,593 @@ def resolve_executable(path: str) -> str | None:
     return None
 
 
-def run_command(command: list[str], timeout: int | None = None) -> subprocess.CompletedProcess:
-    logging.debug("Running command: %s", " ".join(command))
+def _log_command(command: list[str]) -> None:
+    # Skip building the joined string unless it will actually be emitted.
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Running command: %s", " ".join(command))
+
+
+def run_command(
+    command: list[str], timeout: int | None = None, decode: bool = True
+) -> subprocess.CompletedProcess:
+    _log_command(command)
     try:
         return subprocess.run(
             command,
-            capture_output=True,
-            text=True,
+            stdout=subprocess.PIPE if decode else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=decode,
             timeout=timeout,
             check=False,
+            creationflags=_CREATION_FLAGS,
         )
     except subprocess.TimeoutExpired as exc:
         raise CommandError(f"Command timed out: {' '.join(command)}") from exc
 
 
-def adb_command(adb_path: str, args: list[str], timeout: int | None = None) -> subprocess.CompletedProcess:
-    return run_command([adb_path, *args], timeout=timeout)
+@contextmanager
+def run_command_streaming(command: list[str]) -> Iterator[Iterator[str]]:
+    """Start ``command`` and yield an iterator over its stdout lines.
+
+    The process is terminated when the ``with`` block exits, so callers can stop
+    reading as soon as they have what they need. The line iterator raises
+    CommandError once exhausted if the command exited non-zero.
+    """
+    _log_command(command)
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        creationflags=_CREATION_FLAGS,
+    )
+
+    def lines() -> Iterator[str]:
+        for line in process.stdout:
+            yield line.rstrip("\r\n")
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise CommandError(stderr.strip() or f"Command failed: {' '.join(command)}")
+
+    try:
+        yield lines()
+    finally:
+        if process.poll() is None:
+            process.terminate()
+        process.stdout.close()
+        process.stderr.close()
+        process.wait()
+
+
+def command_stderr(result: subprocess.CompletedProcess) -> str:
+    stderr = result.stderr or ""
+    if isinstance(stderr, bytes):
+        stderr = stderr.decode(errors="replace")
+    return stderr.strip()
+
+
+def command_failure(result: subprocess.CompletedProcess) -> str:
+    # devcon reports failures on stdout, so fall back to it when stderr is empty.
+    detail = command_stderr(result) or (result.stdout or "").strip()
+    return detail or f"exit code {result.returncode}"
+
+
+def adb_command(
+    adb_path: str, args: list[str], timeout: int | None = None, decode: bool = True
+) -> subprocess.CompletedProcess:
+    return run_command([adb_path, *args], timeout=timeout, decode=decode)
 
 
 def parse_adb_devices(output: str, serial: str | None) -> str | None:
-    lines = [line.strip() for line in output.splitlines() if line.strip()]
-    if not lines:
-        return None
-    for line in lines:
-        if line.lower().startswith("list of devices"):
-            continue
-        parts = line.split()
-        if len(parts) < 2:
+    for match in _DEV_LINE.finditer(output):
+        device_serial, state = match.group(1), match.group(2)
+        if device_serial.lower() == "list" and state.lower() == "of":
             continue
-        device_serial, state = parts[0], parts[1]
         if serial and device_serial != serial:
             continue
         return state
     return None
 
 
-def is_adb_healthy(adb_path: str, serial: str | None) -> bool:
+def get_adb_state(adb_path: str, serial: str | None, max_age: float = HEALTH_CACHE_TTL) -> str | None:
+    key = (adb_path, serial)
+    cached = _HEALTH_CACHE.get(key)
+    now = time.monotonic()
+    if cached and now - cached[0] < max_age:
+        return cached[1]
+    state = _query_adb_state(adb_path, serial)
+    _HEALTH_CACHE[key] = (time.monotonic(), state)
+    return state
+
+
+def is_adb_healthy(adb_path: str, serial: str | None, max_age: float = HEALTH_CACHE_TTL) -> bool:
+    return get_adb_state(adb_path, serial, max_age) == ADB_HEALTHY_STATE
+
+
+def _query_adb_state(adb_path: str, serial: str | None) -> str | None:
     result = adb_command(adb_path, ["devices"])
     if result.returncode != 0:
         logging.warning("adb devices failed: %s", result.stderr.strip())
-        return False
+        return None
     state = parse_adb_devices(result.stdout, serial)
     if state is None:
         logging.info("No ADB device found.")
-        return False
-    if state == ADB_HEALTHY_STATE:
+    elif state == ADB_HEALTHY_STATE:
         logging.info("ADB device is healthy (%s).", state)
-        return True
-    logging.warning("ADB device unhealthy (%s).", state)
-    return False
+    else:
+        logging.warning("ADB device unhealthy (%s).", state)
+    return state
 
 
-def soft_reset(adb_path: str) -> None:
-    for args in ADB_SOFT_RESET_COMMANDS:
-        result = adb_command(adb_path, args)
+def _run_adb_sequence(adb_path: str, commands: list[list[str]]) -> None:
+    _HEALTH_CACHE.clear()
+    for args in commands:
+        result = adb_command(adb_path, args, decode=False)
         if result.returncode != 0:
-            logging.warning("adb %s failed: %s", " ".join(args), result.stderr.strip())
+            logging.warning("adb %s failed: %s", " ".join(args), command_stderr(result))
 
 
-def parse_devcon_findall(output: str) -> list[tuple[str, str]]:
-    devices = []
-    for line in output.splitlines():
-        if ":" not in line:
-            continue
-        instance_id, name = line.split(":", 1)
-        devices.append((instance_id.strip(), name.strip()))
-    return devices
+def soft_reset(adb_path: str) -> None:
+    _run_adb_sequence(adb_path, ADB_SOFT_RESET_COMMANDS)
 
 
-def parse_devcon_hwids(output: str) -> list[dict[str, object]]:
-    devices: list[dict[str, object]] = []
+def restart_adb_server(adb_path: str) -> None:
+    _run_adb_sequence(adb_path, ADB_SERVER_RESTART_COMMANDS)
+
+
+def _is_android_name(name: str) -> bool:
+    return _ANDROID_NAME_CF in name.casefold()
+
+
+def iter_devcon_hwids(lines: Iterable[str]) -> Iterator[dict[str, object]]:
     current: dict[str, object] | None = None
-    for line in output.splitlines():
+    for line in lines:
         if not line.strip():
             if current:
-                devices.append(current)
+                yield current
+                current = None
+            continue
+        if not line.startswith(" "):
+            if current:
+                yield current
                 current = None
+            instance_id, _, name = line.partition(":")
+            # Instance IDs are bus paths (USB\...); this skips devcon's
+            # "N matching device(s) found." summary and other non-device lines.
+            if "\\" not in instance_id:
+                continue
+            name = name.strip()
+            current = {
+                "id": instance_id.strip(),
+                "name": name,
+                "hwids": [],
+                "matched_by_name": _is_android_name(name),
+            }
             continue
-        if ":" in line and not line.startswith(" "):
-            instance_id, name = line.split(":", 1)
-            current = {"id": instance_id.strip(), "name": name.strip(), "hwids": []}
+        if current is None:
             continue
-        if current is not None:
-            match = re.search(r"USB\\VID_[0-9A-Fa-f]{4}&PID_[0-9A-Fa-f]{4}", line)
-            if match:
-                current["hwids"].append(match.group(0).upper())
+        field = line.strip()
+        if field.startswith("Name:"):
+            current["name"] = field.split(":", 1)[1].strip()
+            current["matched_by_name"] = _is_android_name(current["name"])
+            continue
+        match = _HWID_RE.search(line)
+        if match:
+            current["hwids"].append(match.group(0).upper())
     if current:
-        devices.append(current)
-    return devices
-
-
-def find_devcon_device(devcon_path: str) -> str | None:
-    findall = run_command([devcon_path, "findall", "=usb"])
-    if findall.returncode == 0:
-        devices = parse_devcon_findall(findall.stdout)
-        for instance_id, name in devices:
-            if ANDROID_DEVICE_NAME.lower() in name.lower():
-                logging.info("Matched device by name: %s", name)
-                return instance_id
-
-    hwids_result = run_command([devcon_path, "hwids", "=usb"])
-    if hwids_result.returncode != 0:
-        logging.error("devcon hwids failed: %s", hwids_result.stderr.strip())
+        yield current
+
+
+def parse_devcon_hwids(output: str) -> list[dict[str, object]]:
+    return list(iter_devcon_hwids(output.splitlines()))
+
+
+def _cache_path() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, DEVCON_CACHE_DIR, DEVCON_CACHE_FILE)
+
+
+def _cache_key(serial: str | None) -> str:
+    return "|".join([serial or "*", ANDROID_DEVICE_NAME, *sorted(COMMON_ANDROID_VIDS)])
+
+
+def _load_cache() -> dict[str, str]:
+    try:
+        with open(_cache_path(), encoding="utf-8") as handle:
+            data = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_cache(serial: str | None, instance_id: str) -> None:
+    cache = _load_cache()
+    cache[_cache_key(serial)] = instance_id
+    path = _cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(cache, handle)
+    except OSError as exc:
+        logging.debug("Unable to write devcon cache %s: %s", path, exc)
+
+
+def devcon_instance(instance_id: str) -> str:
+    # devcon treats a bare argument as a hardware ID pattern; "@" selects an instance ID.
+    return "@" + instance_id
+
+
+def is_devcon_device_present(devcon_path: str, instance_id: str) -> bool:
+    result = run_command([devcon_path, "status", devcon_instance(instance_id)])
+    if result.returncode != 0:
+        return False
+    output = result.stdout.upper()
+    return "USB\\" in output and "NO MATCHING DEVICES" not in output
+
+
+def find_devcon_device(devcon_path: str, serial: str | None = None) -> str | None:
+    cached_id = _load_cache().get(_cache_key(serial))
+    if cached_id and is_devcon_device_present(devcon_path, cached_id):
+        logging.info("Using cached device instance: %s", cached_id)
+        return cached_id
+
+    instance_id, matched_by_name = scan_devcon_device(devcon_path)
+    # Only cache name matches: a VID-only fallback (e.g. an MTP interface) must
+    # not shadow a real ADB interface that shows up on a later run.
+    if instance_id and matched_by_name:
+        _save_cache(serial, instance_id)
+    return instance_id
+
+
+def scan_devcon_device(devcon_path: str) -> tuple[str | None, bool]:
+    """Return the matching instance ID and whether it was matched by name."""
+    # `devcon hwids` lists each device's friendly name alongside its hardware
+    # IDs, so a single enumeration covers both the name and VID/PID lookups.
+    vid_match_id: str | None = None
+    vid_match_hwid = ""
+    with run_command_streaming([devcon_path, "hwids", "=usb"]) as hwids_lines:
+        try:
+            for device in iter_devcon_hwids(hwids_lines):
+                if device.get("matched_by_name"):
+                    logging.info("Matched device by name: %s", device["name"])
+                    return str(device["id"]), True
+                if vid_match_id is not None:
+                    continue
+                for hwid in device.get("hwids", []):
+                    if _ANDROID_VID_RE.search(hwid):
+                        vid_match_id, vid_match_hwid = str(device["id"]), hwid
+                        break
+        except CommandError as exc:
+            logging.error("devcon hwids failed: %s", exc)
+            return None, False
+    if vid_match_id:
+        logging.info("Matched device by VID/PID: %s", vid_match_hwid)
+    return vid_match_id, False
+
+
+def wait_for_devcon_disabled(devcon_path: str, instance_id: str, timeout: float = DEVCON_DISABLE_WAIT) -> bool:
+    deadline = time.time() + timeout
+    while True:
+        try:
+            status = run_command([devcon_path, "status", devcon_instance(instance_id)], timeout=5)
+        except CommandError as exc:
+            logging.debug("devcon status failed: %s", exc)
+        else:
+            if status.returncode == 0 and "disabled" in status.stdout.lower():
+                return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(DEVCON_STATUS_INTERVAL, remaining))
+
+
+def _devcon_change(devcon_path: str, action: str, instance_id: str) -> subprocess.CompletedProcess | None:
+    """Run a devcon state change; return None on success, else the failed result."""
+    result = run_command([devcon_path, action, devcon_instance(instance_id)])
+    if result.returncode == DEVCON_REBOOT_REQUIRED:
+        logging.warning("devcon %s on %s succeeded but Windows requires a reboot to finish.", action, instance_id)
         return None
-    for device in parse_devcon_hwids(hwids_result.stdout):
-        for hwid in device.get("hwids", []):
-            vid_match = re.search(r"VID_([0-9A-F]{4})", hwid)
-            if vid_match and vid_match.group(1) in COMMON_ANDROID_VIDS:
-                logging.info("Matched device by VID/PID: %s", hwid)
-                return str(device["id"])
-    return None
+    return result if result.returncode != 0 else None
 
 
 def hard_reset(devcon_path: str, instance_id: str, dry_run: bool) -> bool:
+    _HEALTH_CACHE.clear()
     if dry_run:
-        logging.info("Dry run: would disable %s", instance_id)
-        logging.info("Dry run: would enable %s", instance_id)
+        logging.info("Dry run: would restart %s (disable/enable if restart is unsupported)", instance_id)
         return True
-    disable = run_command([devcon_path, "disable", instance_id])
-    if disable.returncode != 0:
-        logging.error("devcon disable failed: %s", disable.stderr.strip())
+    # `devcon restart` disables and re-enables in one process; older builds
+    # without it fall back to the explicit disable/enable pair.
+    failure = _devcon_change(devcon_path, "restart", instance_id)
+    if failure is None:
+        return True
+    logging.warning("devcon restart failed (%s); falling back to disable/enable.", command_failure(failure))
+    failure = _devcon_change(devcon_path, "disable", instance_id)
+    if failure is not None:
+        logging.error("devcon disable failed: %s", command_failure(failure))
         return False
-    time.sleep(2)
-    enable = run_command([devcon_path, "enable", instance_id])
-    if enable.returncode != 0:
-        logging.error("devcon enable failed: %s", enable.stderr.strip())
+    if not wait_for_devcon_disabled(devcon_path, instance_id):
+        logging.debug("devcon did not report %s as disabled; enabling anyway.", instance_id)
+    failure = _devcon_change(devcon_path, "enable", instance_id)
+    if failure is not None:
+        logging.error("devcon enable failed: %s", command_failure(failure))
         return False
     return True
 
 
-def poll_until_healthy(adb_path: str, serial: str | None, timeout: int) -> bool:
+def poll_until_healthy(
+    adb_path: str,
+    serial: str | None,
+    timeout: float,
+    initial_delay: float = POLL_INITIAL_DELAY,
+    max_delay: float = POLL_MAX_DELAY,
+) -> bool:
     deadline = time.time() + timeout
-    while time.time() < deadline:
-        if is_adb_healthy(adb_path, serial):
+    delay = initial_delay
+    # Only the first check may reuse a result the caller just fetched (e.g. the
+    # wait_for_device confirmation); every check after a sleep must be fresh.
+    max_age = HEALTH_CACHE_TTL
+    while True:
+        if is_adb_healthy(adb_path, serial, max_age):
             return True
-        time.sleep(2)
-    return False
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * POLL_BACKOFF_FACTOR, max_delay)
+        max_age = 0
+
+
+def wait_for_device(
+    adb_path: str,
+    serial: str | None,
+    timeout: int,
+    initial_delay: float = POLL_INITIAL_DELAY,
+    max_delay: float = POLL_MAX_DELAY,
+) -> bool:
+    deadline = time.time() + timeout
+    args = (["-s", serial] if serial else []) + ["wait-for-device"]
+    try:
+        result = adb_command(adb_path, args, timeout=timeout)
+    except CommandError:
+        # wait-for-device already blocked for the whole budget waiting for the
+        # `device` state, so polling afterwards could not see anything new.
+        logging.debug("adb wait-for-device timed out.")
+        return False
+    if result.returncode == 0 and is_adb_healthy(adb_path, serial):
+        return True
+    if result.returncode != 0:
+        logging.warning("adb wait-for-device failed: %s", result.stderr.strip())
+    # Either wait-for-device errored out, or it returned before the device was
+    # fully usable (e.g. unauthorized); poll with backoff for whatever is left.
+    remaining = max(0.0, deadline - time.time())
+    return poll_until_healthy(adb_path, serial, remaining, initial_delay, max_delay)
 
 
-def main() -> int:
-    args = parse_args()
-    configure_logging(args.verbose)
+def _adb_recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("adb server closed the connection")
+        data += chunk
+    return data
 
-    if not is_windows_admin():
-        logging.error("Administrator privileges are required on Windows.")
-        return 3
 
-    adb_path = resolve_executable(args.adb_path)
-    devcon_path = resolve_executable(args.devcon_path)
-    if not adb_path:
-        logging.error("adb.exe not found at %s", args.adb_path)
-        return 2
-    if not devcon_path:
-        logging.error("devcon.exe not found at %s", args.devcon_path)
-        return 2
+def _adb_recv_message(sock: socket.socket) -> str:
+    length = int(_adb_recv_exact(sock, 4), 16)
+    return _adb_recv_exact(sock, length).decode(errors="replace")
+
 
-    if is_adb_healthy(adb_path, args.serial):
+def _adb_pop_message(buffer: bytearray) -> str | None:
+    """Remove and return one length-prefixed message from ``buffer``, if complete."""
+    if len(buffer) < 4:
+        return None
+    length = int(buffer[:4], 16)
+    if len(buffer) < 4 + length:
+        return None
+    payload = bytes(buffer[4 : 4 + length])
+    del buffer[: 4 + length]
+    return payload.decode(errors="replace")
+
+
+def connect_track_devices(address: tuple[str, int] = ADB_SERVER_ADDRESS) -> socket.socket:
+    sock = socket.create_connection(address, timeout=ADB_SERVER_CONNECT_TIMEOUT)
+    try:
+        request = b"host:track-devices"
+        sock.sendall(b"%04x%s" % (len(request), request))
+        status = _adb_recv_exact(sock, 4)
+        if status != b"OKAY":
+            raise CommandError(f"adb track-devices failed: {_adb_recv_message(sock)}")
+    except BaseException:
+        sock.close()
+        raise
+    # Clear the connect timeout; readers set their own per-recv timeouts.
+    sock.settimeout(None)
+    return sock
+
+
+def recover(adb_path: str, devcon_path: str, args: argparse.Namespace, state: str | None) -> int:
+    if state == ADB_HEALTHY_STATE:
         return 0
+    if args.fast_fail and state in ADB_UNRECOVERABLE_STATES:
+        logging.error("ADB device is %s; accept the USB debugging prompt or fix permissions.", state)
+        return 4
 
     logging.info("Attempting soft reset of ADB server.")
     soft_reset(adb_path)
-    if poll_until_healthy(adb_path, args.serial, args.timeout):
+    if wait_for_device(adb_path, args.serial, args.timeout, args.poll_initial, args.poll_max):
         return 0
 
     logging.warning("Soft reset did not recover device; attempting hard reset.")
-    instance_id = find_devcon_device(devcon_path)
+    instance_id = find_devcon_device(devcon_path, args.serial)
     if not instance_id:
         logging.error("Unable to locate Android USB device for hard reset.")
         return 1
 
-    if not hard_reset(devcon_path, instance_id, args.dry_run):
-        return 1
+    # devcon and adb touch independent stacks, so restart the adb server while
+    # the USB device is being cycled; wait_for_device then blocks until the
+    # device re-enumerates on the fresh server.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        reset_future = executor.submit(hard_reset, devcon_path, instance_id, args.dry_run)
+        executor.submit(restart_adb_server, adb_path).result()
+        if not reset_future.result():
+            return 1
 
-    soft_reset(adb_path)
-    if poll_until_healthy(adb_path, args.serial, args.timeout):
+    if wait_for_device(adb_path, args.serial, args.timeout, args.poll_initial, args.poll_max):
         return 0
 
     logging.error("Device did not recover before timeout.")
     return 1
 
 
+def _grace_period(state: str | None, previous: str | None, timeout: int) -> float | None:
+    """Seconds ``state`` may persist before recovery, or None to not act on it.
+
+    Only `offline` is treated as wedged. Every other state (connecting,
+    authorizing, recovery, sideload, bootloader, ...) is left alone.
+    """
+    if state != ADB_OFFLINE_STATE:
+        return None
+    # A freshly plugged device reports `offline` during its handshake; give it
+    # the full recovery window to finish on its own.
+    if previous is None:
+        return float(timeout)
+    return DAEMON_GRACE_PERIOD
+
+
+def _connect_adb_server(adb_path: str) -> socket.socket | None:
+    try:
+        return connect_track_devices()
+    except (OSError, CommandError) as exc:
+        # The server may not be running yet, or is restarting after a reset.
+        logging.debug("Unable to reach adb server (%s); starting it.", exc)
+    adb_command(adb_path, ["start-server"], decode=False)
+    try:
+        return connect_track_devices()
+    except (OSError, CommandError) as exc:
+        logging.debug("Unable to reach adb server after start-server: %s", exc)
+        return None
+
+
+def run_daemon(adb_path: str, devcon_path: str, args: argparse.Namespace) -> int | None:
+    """Watch the adb server's device stream and recover devices that stay unhealthy.
+
+    Returns None if the adb server cannot be reached at startup so the caller
+    can fall back to a one-shot run.
+    """
+    connected_once = False
+    failures = 0
+    try:
+        while True:
+            sock = _connect_adb_server(adb_path)
+            if sock is None:
+                if not connected_once:
+                    logging.warning("Unable to track devices via adb server.")
+                    return None
+                logging.error("Lost connection to adb server.")
+                return 1
+            connected_once = True
+            logging.info("Tracking ADB devices via %s:%d.", *ADB_SERVER_ADDRESS)
+
+            # Each stream starts from a fresh snapshot; recovery restarts the
+            # server, so a stream never outlives a recover() call.
+            last_state: str | None = None
+            deadline: float | None = None
+            buffer = bytearray()
+            with sock:
+                while True:
+                    snapshot = _adb_pop_message(buffer)
+                    if snapshot is None:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            if failures < DAEMON_MAX_RECOVERIES:
+                                break
+                            logging.error(
+                                "Device still %s after %d recovery attempts; waiting for it to recover.",
+                                last_state,
+                                failures,
+                            )
+                            deadline = None
+                            continue
+                        # Never block indefinitely: on Windows a blocking recv cannot
+                        # be interrupted by Ctrl+C. The timeout also serves as the
+                        # pending recovery's grace timer; settimeout(0) would mean
+                        # non-blocking, which the expired-deadline check above avoids.
+                        timeout = DAEMON_READ_INTERVAL if remaining is None else min(DAEMON_READ_INTERVAL, remaining)
+                        sock.settimeout(timeout)
+                        try:
+                            chunk = sock.recv(4096)
+                        except TimeoutError:
+                            continue
+                        except OSError as exc:
+                            logging.debug("adb track-devices stream ended: %s", exc)
+                            deadline = None
+                            break
+                        if not chunk:
+                            logging.debug("adb track-devices stream ended: server closed the connection")
+                            deadline = None
+                            break
+                        buffer += chunk
+                        continue
+                    # Each message is an `adb devices`-formatted snapshot.
+                    state = parse_adb_devices(snapshot, args.serial)
+                    if state == last_state:
+                        continue
+                    previous, last_state = last_state, state
+                    logging.info("ADB device state: %s -> %s", previous, state)
+                    if state == ADB_HEALTHY_STATE:
+                        failures = 0
+                        deadline = None
+                    elif state is None:
+                        # A plain unplug is left alone; an offline device that then
+                        # vanished keeps its pending recovery.
+                        if previous != ADB_OFFLINE_STATE:
+                            deadline = None
+                    else:
+                        grace = _grace_period(state, previous, args.timeout)
+                        deadline = None if grace is None else time.monotonic() + grace
+
+            if deadline is None:
+                continue
+            logging.warning("ADB device stayed %s; starting recovery.", last_state or "missing")
+            if recover(adb_path, devcon_path, args, last_state) == 0:
+                failures = 0
+            else:
+                failures += 1
+                logging.warning("Recovery attempt %d of %d failed.", failures, DAEMON_MAX_RECOVERIES)
+    except KeyboardInterrupt:
+        return 0
+
+
+def main() -> int:
+    args = parse_args()
+    configure_logging(args.verbose)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        admin_future = executor.submit(is_windows_admin)
+        adb_future = executor.submit(resolve_executable, args.adb_path)
+        devcon_future = executor.submit(resolve_executable, args.devcon_path)
+    if not admin_future.result():
+        logging.error("Administrator privileges are required on Windows.")
+        return 3
+
+    adb_path = adb_future.result()
+    devcon_path = devcon_future.result()
+    if not adb_path:
+        logging.error("adb.exe not found at %s", args.adb_path)
+        return 2
+    if not devcon_path:
+        logging.error("devcon.exe not found at %s", args.devcon_path)
+        return 2
+
+    if args.daemon:
+        result = run_daemon(adb_path, devcon_path, args)
+        if result is not None:
+            return result
+        logging.warning("Falling back to a single recovery pass.")
+
+    return recover(adb_path, devcon_path, args, get_adb_state(adb_path, args.serial))
+
+
 if __name__ == "__main__":
     sys.exit(main())